@@ -120,18 +120,27 @@ class DRL4TSP(nn.Module):
         elements are updated, and is called after each 'point' to the input element.
     mask_fn: function or None
         Allows us to specify which elements of the input sequence are allowed to
-        be selected. This is useful for speeding up training of the networks,
-        by providing a sort of 'rules' guidlines to the algorithm. If no mask
+        be selected, returned as a boolean mask. This is useful for speeding up
+        training of the networks, by providing a sort of 'rules' guidlines to
+        the algorithm. If no mask
         is provided, we terminate the search after a fixed number of iterations
         to avoid tours that stretch forever
     num_layers: int
         Specifies the number of hidden layers to use in the decoder RNN
     dropout: float
         Defines the dropout rate for the decoder
+    dynamic_fn: function or None
+        If provided, converts the dynamic elements into the (floating point)
+        features seen by the network, e.g. when the task stores them as integers
+    depot_start: bool
+        If True and no decoder input is given, the decoder starts from the first
+        static element of each sample (e.g. the depot for the VRP) instead of
+        the proxy initial state
     """
 
     def __init__(self, static_size, dynamic_size, hidden_size,
-                 update_fn=None, mask_fn=None, num_layers=1, dropout=0.):
+                 update_fn=None, mask_fn=None, num_layers=1, dropout=0.,
+                 dynamic_fn=None, depot_start=False):
         super(DRL4TSP, self).__init__()
 
         if dynamic_size < 1:
@@ -140,6 +149,8 @@ class DRL4TSP(nn.Module):
 
         self.update_fn = update_fn
         self.mask_fn = mask_fn
+        self.dynamic_fn = dynamic_fn
+        self.depot_start = depot_start
 
         # Define the encoder & decoder models
         self.static_encoder = Encoder(static_size, hidden_size)
@@ -175,11 +186,14 @@ class DRL4TSP(nn.Module):
 
         batch_size, input_size, sequence_size = static.size()
 
-        if decoder_input is None:
+        if decoder_input is None and self.depot_start:
+            decoder_input = static[:, :, :1]
+        elif decoder_input is None:
             decoder_input = self.x0.expand(batch_size, -1, -1)
 
         # Always use a mask - if no function is provided, we don't update it
-        mask = torch.ones(batch_size, sequence_size, device=device)
+        mask = torch.ones(batch_size, sequence_size, dtype=torch.bool,
+                          device=device)
 
         # Structures for holding the output sequences
         tour_idx, tour_logp = [], []
@@ -189,11 +203,11 @@ class DRL4TSP(nn.Module):
         # all 'pointing' iterations. When / if the dynamic elements change,
         # their representations will need to get calculated again.
         static_hidden = self.static_encoder(static)
-        dynamic_hidden = self.dynamic_encoder(dynamic)
+        dynamic_hidden = self.encode_dynamic(dynamic)
 
         for _ in range(max_steps):
 
-            if not mask.byte().any():
+            if not mask.any():
                 break
 
             # ... but compute a hidden rep for each element added to sequence
@@ -202,7 +216,7 @@ class DRL4TSP(nn.Module):
             probs, last_hh = self.pointer(static_hidden,
                                           dynamic_hidden,
                                           decoder_hidden, last_hh)
-            probs = F.softmax(probs + mask.log(), dim=1)
+            probs = F.softmax(probs.masked_fill(~mask, float('-inf')), dim=1)
 
             # When training, sample the next step according to its probability.
             # During testing, we can take the greedy approach and choose highest
@@ -212,7 +226,7 @@ class DRL4TSP(nn.Module):
                 # Sometimes an issue with Categorical & sampling on GPU; See:
                 # https://github.com/pemami4911/neural-combinatorial-rl-pytorch/issues/5
                 ptr = m.sample()
-                while not torch.gather(mask, 1, ptr.data.unsqueeze(1)).byte().all():
+                while not torch.gather(mask, 1, ptr.data.unsqueeze(1)).all():
                     ptr = m.sample()
                 logp = m.log_prob(ptr)
             else:
@@ -222,13 +236,13 @@ class DRL4TSP(nn.Module):
             # After visiting a node update the dynamic representation
             if self.update_fn is not None:
                 dynamic = self.update_fn(dynamic, ptr.data)
-                dynamic_hidden = self.dynamic_encoder(dynamic)
+                dynamic_hidden = self.encode_dynamic(dynamic)
 
                 # Since we compute the VRP in minibatches, some tours may have
                 # number of stops. We force the vehicles to remain at the depot 
                 # in these cases, and logp := 0
-                is_done = dynamic[:, 1].sum(1).eq(0).float()
-                logp = logp * (1. - is_done)
+                is_done = dynamic[:, 1].sum(1).eq(0)
+                logp = logp.masked_fill(is_done, 0.)
 
             # And update the mask so we don't re-visit if we don't need to
             if self.mask_fn is not None:
@@ -246,6 +260,11 @@ class DRL4TSP(nn.Module):
 
         return tour_idx, tour_logp
 
+    def encode_dynamic(self, dynamic):
+        if self.dynamic_fn is not None:
+            dynamic = self.dynamic_fn(dynamic)
+        return self.dynamic_encoder(dynamic)
+
 
 if __name__ == '__main__':
     raise Exception('Cannot be called from main')
@@ -4,8 +4,8 @@ The TSP is defined by the following traits:
     1. Each city in the list must be visited once and only once
     2. The salesman must return to the original node at the end of the tour
 
-Since the TSP doesn't have dynamic elements, we return an empty list on
-__getitem__, which gets processed in trainer.py to be None
+Since the TSP doesn't have dynamic elements, __getitem__ returns a vector of
+zeros in their place
 
 """
 
@@ -26,9 +26,9 @@ class TSPDataset(Dataset):
         if seed is None:
             seed = np.random.randint(123456789)
 
-        np.random.seed(seed)
-        torch.manual_seed(seed)
-        self.dataset = torch.rand((num_samples, 2, size))
+        # Use a local generator so building a dataset doesn't reseed the process
+        rng = torch.Generator().manual_seed(seed)
+        self.dataset = torch.rand((num_samples, 2, size), generator=rng)
         self.dynamic = torch.zeros(num_samples, 1, size)
         self.num_nodes = size
         self.size = num_samples
@@ -37,13 +37,13 @@ class TSPDataset(Dataset):
         return self.size
 
     def __getitem__(self, idx):
-        # (static, dynamic, start_loc)
-        return (self.dataset[idx], self.dynamic[idx], [])
+        # (static, dynamic)
+        return (self.dataset[idx], self.dynamic[idx])
 
 
 def update_mask(mask, dynamic, chosen_idx):
     """Marks the visited city, so it can't be selected a second time."""
-    mask.scatter_(1, chosen_idx.unsqueeze(1), 0)
+    mask.scatter_(1, chosen_idx.unsqueeze(1), False)
     return mask
 
 
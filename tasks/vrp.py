@@ -9,16 +9,18 @@ The VRP is defined by the following traits:
 import os
 import numpy as np
 import torch
+import torch.nn.functional as F
 from torch.utils.data import Dataset
 from torch.autograd import Variable
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 
 
 class VehicleRoutingDataset(Dataset):
     def __init__(self, num_samples, input_size, max_load=20, max_demand=9,
-                 seed=None):
+                 seed=None, device=None, pin_memory=False):
         super(VehicleRoutingDataset, self).__init__()
 
         if max_load < max_demand:
@@ -26,39 +28,56 @@ class VehicleRoutingDataset(Dataset):
 
         if seed is None:
             seed = np.random.randint(1234567890)
-        np.random.seed(seed)
-        torch.manual_seed(seed)
+
+        # Use a local generator so building a dataset doesn't reseed the process
+        rng = torch.Generator(device=device).manual_seed(seed)
 
         self.num_samples = num_samples
         self.max_load = max_load
         self.max_demand = max_demand
 
         # Depot location will be the first node in each
-        locations = torch.rand((num_samples, 2, input_size + 1))
+        locations = torch.rand((num_samples, 2, input_size + 1), generator=rng,
+                               device=device)
         self.static = locations
 
-        # All states will broadcast the drivers current load
-        # Note that we only use a load between [0, 1] to prevent large
-        # numbers entering the neural network
+        # All states will broadcast the drivers current load. Loads & demands
+        # are stored as integers in units of 1 / max_load, so the updates are
+        # exact; see float_view() for the values that enter the network
         dynamic_shape = (num_samples, 1, input_size + 1)
-        loads = torch.full(dynamic_shape, 1.)
+        loads = torch.full(dynamic_shape, max_load, dtype=torch.int16,
+                           device=device)
 
-        # All states will have their own intrinsic demand in [1, max_demand), 
-        # then scaled by the maximum load. E.g. if load=10 and max_demand=30, 
-        # demands will be scaled to the range (0, 3)
-        demands = torch.randint(1, max_demand + 1, dynamic_shape)
-        demands = demands / float(max_load)
+        # All states will have their own intrinsic demand in [1, max_demand]
+        demands = torch.randint(1, max_demand + 1, dynamic_shape, generator=rng,
+                                dtype=torch.int16, device=device)
 
         demands[:, 0, 0] = 0  # depot starts with a demand of 0
-        self.dynamic = torch.tensor(np.concatenate((loads, demands), axis=1))
+        self.dynamic = torch.cat((loads, demands), dim=1)
+
+        # Page-locked host memory allows async copies to the GPU when training
+        if pin_memory:
+            self.static = self.static.pin_memory()
+            self.dynamic = self.dynamic.pin_memory()
 
     def __len__(self):
         return self.num_samples
 
     def __getitem__(self, idx):
-        # (static, dynamic, start_loc)
-        return (self.static[idx], self.dynamic[idx], self.static[idx, :, 0:1])
+        # (static, dynamic); the depot start location is read off static
+        return (self.static[idx], self.dynamic[idx])
+
+    def float_view(self, dynamic):
+        """Scales the integer (load, demand) values to the range used by the
+        network.
 
+        Only a load between [0, 1] is used to prevent large numbers entering
+        the neural network. E.g. if load=10 and max_demand=30, demands will be
+        scaled to the range (0, 3)
+        """
+        return dynamic.float() / self.max_load
+
+    @torch.compile(dynamic=True)
     def update_mask(self, mask, dynamic, chosen_idx=None):
         """Updates the mask used to hide non-valid states.
 
@@ -67,72 +86,71 @@ class VehicleRoutingDataset(Dataset):
         dynamic: torch.autograd.Variable of size (1, num_feats, seq_len)
         """
 
-        # Convert floating point to integers for calculations
         loads = dynamic.data[:, 0]  # (batch_size, seq_len)
         demands = dynamic.data[:, 1]  # (batch_size, seq_len)
 
         # If there is no positive demand left, we can end the tour.
-        # Note that the first node is the depot, which always has a negative demand
-        if demands.eq(0).all():
-            return demands * 0.
+        # Note that the first node is the depot, which always has a negative demand.
+        # Kept as a tensor so checking it doesn't force a device sync
+        all_done = demands.eq(0).all()
 
         # Otherwise, we can choose to go anywhere where demand is > 0
         new_mask = demands.ne(0) * demands.lt(loads)
 
         # We should avoid traveling to the depot back-to-back
         repeat_home = chosen_idx.ne(0)
-
-        if repeat_home.any():
-            new_mask[repeat_home.nonzero(), 0] = 1.
-        if (1 - repeat_home).any():
-            new_mask[(1 - repeat_home).nonzero(), 0] = 0.
+        new_mask[:, 0] = repeat_home
 
         # ... unless we're waiting for all other samples in a minibatch to finish
-        has_no_load = loads[:, 0].eq(0).float()
-        has_no_demand = demands[:, 1:].sum(1).eq(0).float()
+        # Note city demands are never negative, so no positive demand means none
+        has_no_load = loads[:, 0].eq(0)
+        has_no_demand = ~demands[:, 1:].gt(0).any(1)
 
-        combined = (has_no_load + has_no_demand).gt(0)
-        if combined.any():
-            new_mask[combined.nonzero(), 0] = 1.
-            new_mask[combined.nonzero(), 1:] = 0.
+        combined = has_no_load | has_no_demand
+        new_mask[:, 0].masked_fill_(combined, True)
+        new_mask[:, 1:].masked_fill_(combined.unsqueeze(1), False)
 
-        return new_mask.float()
+        return new_mask.masked_fill_(all_done, False)
 
+    @torch.compile(dynamic=True)
     def update_dynamic(self, dynamic, chosen_idx):
         """Updates the (load, demand) dataset values."""
 
         # Update the dynamic elements differently for if we visit depot vs. a city
         visit = chosen_idx.ne(0)
-        depot = chosen_idx.eq(0)
 
-        # Clone the dynamic variable so we don't mess up graph
-        all_loads = dynamic[:, 0].clone()
-        all_demands = dynamic[:, 1].clone()
+        # The new (load, demand) rows are built from the old ones rather than
+        # written into a clone, so the input is read once and never copied
+        all_loads = dynamic[:, 0]
+        all_demands = dynamic[:, 1]
 
-        load = torch.gather(all_loads, 1, chosen_idx.unsqueeze(1))
-        demand = torch.gather(all_demands, 1, chosen_idx.unsqueeze(1))
+        # The current load is broadcast to every node, so it can be read from
+        # the depot column; the demand at the chosen city is a 1D index per row
+        rows = torch.arange(chosen_idx.size(0), device=chosen_idx.device)
+        load = all_loads[:, 0]
+        demand = all_demands[rows, chosen_idx]
 
         # Across the minibatch - if we've chosen to visit a city, try to satisfy
-        # as much demand as possible
-        if visit.any():
+        # as much demand as possible. Both outcomes are computed for every
+        # sample and selected with `where`, so no device sync is needed
+        diff = load - demand
+        new_load = torch.relu(diff)
+        new_demand = torch.relu(-diff)
 
-            new_load = torch.clamp(load - demand, min=0)
-            new_demand = torch.clamp(demand - load, min=0)
+        # Broadcast the load to all nodes, but update demand seperately.
+        # Returning to the depot refills the vehicle load
+        new_loads = torch.where(visit, new_load, self.max_load)
+        new_loads = new_loads.unsqueeze(1).expand_as(all_loads)
 
-            # Broadcast the load to all nodes, but update demand seperately
-            visit_idx = visit.nonzero().squeeze()
+        nodes = torch.arange(all_demands.size(1), device=chosen_idx.device)
+        depot_demand = torch.where(visit, new_load - self.max_load, 0)
 
-            all_loads[visit_idx] = new_load[visit_idx]
-            all_demands[visit_idx, chosen_idx[visit_idx]] = new_demand[visit_idx].view(-1)
-            all_demands[visit_idx, 0] = -1. + new_load[visit_idx].view(-1)
+        new_demands = torch.where(nodes.eq(chosen_idx.unsqueeze(1)),
+                                  new_demand.unsqueeze(1), all_demands)
+        new_demands = torch.where(nodes.eq(0), depot_demand.unsqueeze(1),
+                                  new_demands)
 
-        # Return to depot to fill vehicle load
-        if depot.any():
-            all_loads[depot.nonzero().squeeze()] = 1.
-            all_demands[depot.nonzero().squeeze(), 0] = 0.
-
-        tensor = torch.cat((all_loads.unsqueeze(1), all_demands.unsqueeze(1)), 1)
-        return torch.tensor(tensor.data, device=dynamic.device)
+        return torch.stack((new_loads, new_demands), dim=1)
 
 
 def reward(static, tour_indices):
@@ -140,18 +158,20 @@ def reward(static, tour_indices):
     Euclidean distance between all cities / nodes given by tour_indices
     """
 
-    # Convert the indices back into a tour
+    # Convert the indices back into a tour, keeping the (batch, feats, len)
+    # layout so the whole batch is handled by a single gather
     idx = tour_indices.unsqueeze(1).expand(-1, static.size(1), -1)
-    tour = torch.gather(static.data, 2, idx).permute(0, 2, 1)
+    tour = static.data.gather(2, idx)
 
     # Ensure we're always returning to the depot - note the extra concat
     # won't add any extra loss, as the euclidean distance between consecutive
     # points is 0
-    start = static.data[:, :, 0].unsqueeze(1)
-    y = torch.cat((start, tour, start), dim=1)
+    start = static.data[:, :, 0:1]
+    y = torch.cat((start, tour, start), dim=2)
 
     # Euclidean distance between each consecutive point
-    tour_len = torch.sqrt(torch.sum(torch.pow(y[:, :-1] - y[:, 1:], 2), dim=2))
+    y = y.transpose(1, 2)
+    tour_len = F.pairwise_distance(y[:, :-1], y[:, 1:], eps=0)
 
     return tour_len.sum(1)
 
@@ -170,35 +190,34 @@ def render(static, tour_indices, save_path):
         axes = [[axes]]
     axes = [a for ax in axes for a in ax]
 
-    for i, ax in enumerate(axes):
+    # Convert the indices back into tours for every plotted sample at once, so
+    # there is only a single copy of the coordinates back to the host
+    num_samples = len(axes)
+    idx = tour_indices[:num_samples].unsqueeze(1).expand(-1, static.size(1), -1)
+    tours = static[:num_samples].data.gather(2, idx)
 
-        # Convert the indices back into a tour
-        idx = tour_indices[i]
-        if len(idx.size()) == 1:
-            idx = idx.unsqueeze(0)
-
-        idx = idx.expand(static.size(1), -1)
-        data = torch.gather(static[i].data, 1, idx).cpu().numpy()
-
-        start = static[i, :, 0].cpu().data.numpy()
-        x = np.hstack((start[0], data[0], start[0]))
-        y = np.hstack((start[1], data[1], start[1]))
+    start = static[:num_samples, :, 0:1].data
+    coords = torch.cat((start, tours, start), dim=2).cpu().numpy()
+    tour_indices = tour_indices[:num_samples].cpu().numpy()
 
-        # Assign each subtour a different colour & label in order traveled
-        idx = np.hstack((0, tour_indices[i].cpu().numpy().flatten(), 0))
-        where = np.where(idx == 0)[0]
+    # Tours start & end at the depot (index 0), matching the padded coords
+    stops = np.zeros((num_samples, tour_indices.shape[1] + 2), tour_indices.dtype)
+    stops[:, 1:-1] = tour_indices
 
-        for j in range(len(where) - 1):
+    for i, ax in enumerate(axes):
 
-            low = where[j]
-            high = where[j + 1]
+        x, y = coords[i]
 
-            if low + 1 == high:
-                continue
+        # Assign each subtour a different colour in order traveled
+        where = np.flatnonzero(stops[i] == 0)
 
-            ax.plot(x[low: high + 1], y[low: high + 1], zorder=1, label=j)
+        points = coords[i].T
+        segments = [points[low: high + 1]
+                    for low, high in zip(where[:-1], where[1:])
+                    if low + 1 != high]
 
-        ax.legend(loc="upper right", fontsize=3, framealpha=0.5)
+        colors = plt.cm.tab10(np.arange(len(segments)) % 10)
+        ax.add_collection(LineCollection(segments, colors=colors, zorder=1))
         ax.scatter(x, y, s=4, c='r', zorder=2)
         ax.scatter(x[0], y[0], s=20, c='k', marker='*', zorder=3)
 
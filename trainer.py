@@ -23,6 +23,9 @@ from model import DRL4TSP, Encoder
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 #device = torch.device('cpu')
 
+# Batches are copied to the GPU asynchronously from page-locked memory
+PIN_MEMORY = device.type == 'cuda'
+
 
 class StateCritic(nn.Module):
     """Estimates the problem complexity.
@@ -31,9 +34,10 @@ class StateCritic(nn.Module):
     the encoder + decoder, and returns an estimate of complexity
     """
 
-    def __init__(self, static_size, dynamic_size, hidden_size):
+    def __init__(self, static_size, dynamic_size, hidden_size, dynamic_fn=None):
         super(StateCritic, self).__init__()
 
+        self.dynamic_fn = dynamic_fn
         self.static_encoder = Encoder(static_size, hidden_size)
         self.dynamic_encoder = Encoder(dynamic_size, hidden_size)
 
@@ -48,6 +52,9 @@ class StateCritic(nn.Module):
 
     def forward(self, static, dynamic):
 
+        if self.dynamic_fn is not None:
+            dynamic = self.dynamic_fn(dynamic)
+
         # Use the probabilities of visiting each
         static_hidden = self.static_encoder(static)
         dynamic_hidden = self.dynamic_encoder(dynamic)
@@ -99,14 +106,13 @@ def validate(data_loader, actor, reward_fn, render_fn=None, save_dir='.',
     rewards = []
     for batch_idx, batch in enumerate(data_loader):
 
-        static, dynamic, x0 = batch
+        static, dynamic = batch
 
-        static = static.to(device)
-        dynamic = dynamic.to(device)
-        x0 = x0.to(device) if len(x0) > 0 else None
+        static = static.to(device, non_blocking=True)
+        dynamic = dynamic.to(device, non_blocking=True)
 
         with torch.no_grad():
-            tour_indices, _ = actor.forward(static, dynamic, x0)
+            tour_indices, _ = actor.forward(static, dynamic)
 
         reward = reward_fn(static, tour_indices).mean().item()
         rewards.append(reward)
@@ -136,8 +142,10 @@ def train(actor, critic, task, num_nodes, train_data, valid_data, reward_fn,
     actor_optim = optim.Adam(actor.parameters(), lr=actor_lr)
     critic_optim = optim.Adam(critic.parameters(), lr=critic_lr)
 
-    train_loader = DataLoader(train_data, batch_size, True, num_workers=0)
-    valid_loader = DataLoader(valid_data, batch_size, False, num_workers=0)
+    train_loader = DataLoader(train_data, batch_size, True, num_workers=0,
+                              pin_memory=PIN_MEMORY)
+    valid_loader = DataLoader(valid_data, batch_size, False, num_workers=0,
+                              pin_memory=PIN_MEMORY)
 
     best_params = None
     best_reward = np.inf
@@ -154,14 +162,13 @@ def train(actor, critic, task, num_nodes, train_data, valid_data, reward_fn,
 
         for batch_idx, batch in enumerate(train_loader):
 
-            static, dynamic, x0 = batch
+            static, dynamic = batch
 
-            static = static.to(device)
-            dynamic = dynamic.to(device)
-            x0 = x0.to(device) if len(x0) > 0 else None
+            static = static.to(device, non_blocking=True)
+            dynamic = dynamic.to(device, non_blocking=True)
 
             # Full forward pass through the dataset
-            tour_indices, tour_logp = actor(static, dynamic, x0)
+            tour_indices, tour_logp = actor(static, dynamic)
 
             # Sum the log probabilities for each city in the tour
             reward = reward_fn(static, tour_indices)
@@ -284,7 +291,8 @@ def train_tsp(args):
     test_data = TSPDataset(args.num_nodes, args.train_size, args.seed + 2)
 
     test_dir = 'test'
-    test_loader = DataLoader(test_data, args.batch_size, False, num_workers=0)
+    test_loader = DataLoader(test_data, args.batch_size, False, num_workers=0,
+                             pin_memory=PIN_MEMORY)
     out = validate(test_loader, actor, tsp.reward, tsp.render, test_dir, num_plot=5)
 
     print('Average tour length: ', out)
@@ -327,9 +335,12 @@ def train_vrp(args):
                     train_data.update_dynamic,
                     train_data.update_mask,
                     args.num_layers,
-                    args.dropout).to(device)
+                    args.dropout,
+                    train_data.float_view,
+                    depot_start=True).to(device)
 
-    critic = StateCritic(STATIC_SIZE, DYNAMIC_SIZE, args.hidden_size).to(device)
+    critic = StateCritic(STATIC_SIZE, DYNAMIC_SIZE, args.hidden_size,
+                         train_data.float_view).to(device)
 
     kwargs = vars(args)
     kwargs['train_data'] = train_data
@@ -354,7 +365,8 @@ def train_vrp(args):
                                       args.seed + 2)
 
     test_dir = 'test'
-    test_loader = DataLoader(test_data, args.batch_size, False, num_workers=0)
+    test_loader = DataLoader(test_data, args.batch_size, False, num_workers=0,
+                             pin_memory=PIN_MEMORY)
     out = validate(test_loader, actor, vrp.reward, vrp.render, test_dir, num_plot=5)
 
     print('Average tour length: ', out)
@@ -380,6 +392,9 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
+    # The datasets use their own generators, so seed the model initialization
+    torch.manual_seed(args.seed)
+
     #print('NOTE: SETTTING CHECKPOINT: ')
     #args.checkpoint = os.path.join('vrp', '10', '12_59_47.350165' + os.path.sep)
     #print(args.checkpoint)